@@ -1,21 +1,125 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import io
+import re
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, urlencode, urlparse
 
-def fetch_csv_from_url(url):
-    if 'docs.google.com' in url:
-        csv_url = url.replace('/edit', '/gviz/tq?tqx=out:csv')
-        response = requests.get(csv_url)
-        if response.status_code == 200:
-            return pd.read_csv(io.StringIO(response.text))
-        else:
-            st.error("Failed to fetch data from the URL.")
-            return None
-    else:
-        st.error("Invalid Google Sheets URL.")
+OUTPUT_COLUMNS = ['First Name', 'Last Name', 'Email', 'Mobile Phone', 'Address', 'City', 'State', 'Zip Code']
+OUTPUT_SCHEMA = pa.schema([(column, pa.string()) for column in OUTPUT_COLUMNS])
+CONTACT_COLUMNS = {
+    'firstname': 'First Name',
+    'lastname': 'Last Name',
+    'propertyaddress': 'Address',
+    'propertycity': 'City',
+    'propertystate': 'State',
+    'propertypostalcode': 'Zip Code',
+}
+# Arrow-backed strings: contiguous UTF-8 buffers instead of one Python object per cell
+STRING_DTYPE = pd.StringDtype('pyarrow')
+PREVIEW_ROWS = 200
+CHUNK_SIZE = 200_000
+
+# Spreadsheet part of a sheet URL, e.g. "/spreadsheets/d/<id>" from ".../d/<id>/edit?usp=sharing",
+# optionally with a multi-account "/u/<n>" segment
+SHEET_PATH_PATTERN = re.compile(r'^/spreadsheets(?:/u/\d+)?/d/[^/]+')
+
+# Trailing number of a header, e.g. 2 in "phone 2" or "phone type 2"
+COLUMN_NUMBER_PATTERN = re.compile(r'(\d+)\s*$')
+
+def is_lead_column(column):
+    column = column.strip().lower()
+    return column in CONTACT_COLUMNS or column.startswith(('phone', 'email'))
+
+def column_number(column):
+    match = COLUMN_NUMBER_PATTERN.search(column)
+    return int(match.group(1)) if match else None
+
+def classify_columns(columns):
+    # Bucket columns by prefix in a single pass over the header
+    phones, types, email_columns = [], [], []
+    for column in columns:
+        if column.startswith('phone type'):
+            types.append(column)
+        elif column.startswith('phone'):
+            phones.append(column)
+        elif column.startswith('email'):
+            email_columns.append(column)
+
+    # Pair phone N with phone type N by number; phones without a numbered match
+    # take the remaining type columns in header order
+    phone_numbers = {column_number(column) for column in phones}
+    numbered_types = {}
+    for column in types:
+        number = column_number(column)
+        if number is not None and number in phone_numbers:
+            numbered_types.setdefault(number, column)
+    spare_types = iter([column for column in types if column not in numbered_types.values()])
+
+    phone_columns, type_columns = [], []
+    for column in phones:
+        type_column = numbered_types.pop(column_number(column), None) or next(spare_types, None)
+        if type_column is not None:
+            phone_columns.append(column)
+            type_columns.append(type_column)
+    return phone_columns, type_columns, email_columns
+
+def read_leads_csv(source, chunksize=None):
+    # Only parse the columns process_leads_data uses, and keep them as plain strings
+    return pd.read_csv(
+        source,
+        usecols=is_lead_column,
+        dtype=STRING_DTYPE,
+        chunksize=chunksize,
+    )
+
+def build_csv_url(url):
+    parsed = urlparse(url.strip())
+    match = SHEET_PATH_PATTERN.match(parsed.path)
+    if parsed.netloc != 'docs.google.com' or not match:
         return None
 
+    # Export only the linked tab when the URL names one (query or #gid= fragment)
+    params = {'tqx': 'out:csv'}
+    gid = parse_qs(parsed.query).get('gid') or parse_qs(parsed.fragment).get('gid')
+    if gid:
+        params['gid'] = gid[0]
+    return parsed._replace(path=match.group(0) + '/gviz/tq', query=urlencode(params, safe=':'), fragment='').geturl()
+
+@st.cache_resource
+def get_session():
+    # Kept across reruns (Streamlit re-executes this module each time) so sheet fetches reuse pooled HTTPS connections
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2))
+    return session
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_csv_from_url(url):
+    # Errors are raised rather than reported so that failed fetches are not cached
+    csv_url = build_csv_url(url)
+    if csv_url is None:
+        raise ValueError("Invalid Google Sheets URL.")
+
+    with get_session().get(csv_url, stream=True, timeout=15) as response:
+        response.raise_for_status()
+        # Let the C parser read the (decompressed) body bytes directly
+        response.raw.decode_content = True
+        try:
+            return read_leads_csv(response.raw)
+        except urllib3.exceptions.HTTPError as e:
+            # Reads from response.raw fail with urllib3 errors, not requests ones
+            raise requests.ConnectionError(e) from e
+
+def to_object_array(df, columns):
+    # Plain object ndarray with NaN for missing cells, whatever the columns' string dtype
+    return df[columns].to_numpy(dtype=object, na_value=np.nan, copy=True)
+
 def get_first_non_empty(row, column_prefix, max_columns=5):
     for i in range(1, max_columns + 1):
         column_name = f"{column_prefix}{i}"
@@ -25,58 +129,123 @@ def get_first_non_empty(row, column_prefix, max_columns=5):
 
 def process_leads_data(df):
     # Normalize column names to lowercase and strip any whitespace
-    df.columns = df.columns.str.strip().str.lower()
+    columns = df.columns.astype(str).str.strip().str.lower()
+    # Names that collide after normalizing get ".1", ".2", ... suffixes, like read_csv's own mangling
+    counts = pd.Series(columns).groupby(columns).cumcount().to_numpy()
+    # NumPy string ops keep this working for an empty header (no lead columns found)
+    columns = columns.to_numpy(dtype=str)
+    suffixed = np.char.add(np.char.add(columns, '.'), counts.astype(str))
+    df = df.set_axis(np.where(counts == 0, columns, suffixed), axis=1)
     
-    phone_columns = [col for col in df.columns if col.startswith('phone') and not col.startswith('phone type')]
-    type_columns = [col for col in df.columns if col.startswith('phone type')]
-    email_columns = [col for col in df.columns if col.startswith('email')]
+    phone_columns, type_columns, email_columns = classify_columns(df.columns)
 
     # Extract Wireless and VOIP phone numbers only, without phone type labels
-    def extract_selected_phones(row):
-        selected_phones = []
-        for phone_col, type_col in zip(phone_columns, type_columns):
-            try:
-                phone = row.get(phone_col, None)
-                phone_type = row.get(type_col, None)
-
-                # Normalize phone type to lowercase for comparison
-                if (
-                    phone is not None and
-                    phone_type is not None and
-                    str(phone_type).strip().lower() in ['wireless', 'voip']
-                ):
-                    selected_phones.append(str(phone).strip())  # Append phone number
-            except Exception as e:
-                st.error(f"Error in extracting phones for row {row.name}: {e}")
-        return selected_phones
-
-    # Normalize email values and phone numbers
-    df['unique_emails'] = df[email_columns].apply(lambda row: row.dropna().unique().tolist(), axis=1)
-    df['selected_phones'] = df.apply(extract_selected_phones, axis=1)
-
-    output_rows = []
-    for _, row in df.iterrows():
-        selected_phones = row['selected_phones']
-        unique_emails = row['unique_emails']
-
-        for i in range(len(selected_phones)):
-            output_rows.append({
-                'First Name': row.get('firstname', ""),
-                'Last Name': row.get('lastname', ""),
-                'Email': unique_emails[i] if i < len(unique_emails) else "",
-                'Mobile Phone': selected_phones[i],
-                'Address': row.get('propertyaddress', ""),
-                'City': row.get('propertycity', ""),
-                'State': row.get('propertystate', ""),
-                'Zip Code': row.get('propertypostalcode', "")
-            })
-
-    # If no rows were added, return an empty DataFrame
-    if not output_rows:
-        return pd.DataFrame(columns=['First Name', 'Last Name', 'Email', 'Mobile Phone', 'Address', 'City', 'State', 'Zip Code'])
-
-    output_df = pd.DataFrame(output_rows)
-    return output_df
+    phone_values = to_object_array(df, phone_columns)
+    # Phone types are a tiny vocabulary, so normalize the distinct labels once and map back by code
+    type_codes, type_labels = pd.factorize(to_object_array(df, type_columns).ravel())
+    # A trailing False entry makes the -1 code of missing types map to "not selected"
+    wanted_types = np.append(np.isin(np.char.lower(np.char.strip(type_labels.astype(str))), ['wireless', 'voip']), False)
+    selected = wanted_types[type_codes].reshape(phone_values.shape) & pd.notna(phone_values)
+    phone_strings = np.char.strip(phone_values.astype(str))
+
+    # Keep the first occurrence of each non-blank email per row, in column order
+    email_values = to_object_array(df, email_columns)
+    keep_email = pd.notna(email_values)
+    email_values[keep_email] = np.char.strip(email_values[keep_email].astype(str))
+    keep_email &= email_values != ""
+    for i in range(1, len(email_columns)):
+        keep_email[:, i] &= ~(email_values[:, :i] == email_values[:, [i]]).any(axis=1)
+
+    # Shift each row's unique emails to the left and pad with a trailing missing column,
+    # so blanks are written the same way as missing contact fields
+    order = np.argsort(~keep_email, axis=1, kind='stable')
+    packed_emails = np.where(
+        np.take_along_axis(keep_email, order, axis=1),
+        np.take_along_axis(email_values, order, axis=1),
+        None,
+    )
+    packed_emails = np.hstack([packed_emails, np.full((len(df), 1), None, dtype=object)])
+
+    # One output row per selected phone, paired with the row's email at the same position
+    row_idx = np.repeat(np.arange(len(df)), selected.sum(axis=1))
+    phone_pos = (np.cumsum(selected, axis=1) - 1)[selected]
+
+    output_df = (
+        df.reindex(columns=list(CONTACT_COLUMNS))
+        .iloc[row_idx]
+        .reset_index(drop=True)
+        .rename(columns=CONTACT_COLUMNS)
+    )
+    output_df['Email'] = packed_emails[row_idx, np.minimum(phone_pos, len(email_columns))]
+    output_df['Mobile Phone'] = phone_strings[selected]
+    return output_df[OUTPUT_COLUMNS].astype(STRING_DTYPE)
+
+def to_output_table(df):
+    return pa.Table.from_pandas(df, schema=OUTPUT_SCHEMA, preserve_index=False)
+
+def to_csv_bytes(table):
+    # Arrow's multithreaded writer emits UTF-8 bytes directly, with no intermediate str
+    csv_buffer = io.BytesIO()
+    pacsv.write_csv(table, csv_buffer)
+    return csv_buffer.getvalue()
+
+def to_parquet_bytes(table):
+    parquet_buffer = io.BytesIO()
+    pq.write_table(table, parquet_buffer, compression='zstd')
+    return parquet_buffer.getvalue()
+
+def hash_frame(df):
+    # Hash every cell; Streamlit's default DataFrame hash only samples large frames
+    return tuple(df.columns), pd.util.hash_pandas_object(df, index=False).values.tobytes()
+
+@st.cache_data(max_entries=4, show_spinner="Processing leads...", hash_funcs={pd.DataFrame: hash_frame})
+def process_sheet_data(df):
+    # Serialize both downloads from one Arrow table; reruns reuse the cached bytes
+    table = to_output_table(process_leads_data(df))
+    return to_csv_bytes(table), to_parquet_bytes(table)
+
+def process_leads_in_chunks(source, chunksize=CHUNK_SIZE):
+    # Read, process and serialize one chunk at a time so memory follows the chunk size, not the file size
+    preview, total_rows = None, 0
+    csv_buffer, parquet_buffer = io.BytesIO(), io.BytesIO()
+    with (
+        pacsv.CSVWriter(csv_buffer, OUTPUT_SCHEMA) as csv_writer,
+        pq.ParquetWriter(parquet_buffer, OUTPUT_SCHEMA, compression='zstd') as parquet_writer,
+    ):
+        for chunk in read_leads_csv(source, chunksize=chunksize):
+            if preview is None:
+                preview = chunk.head(PREVIEW_ROWS)
+            total_rows += len(chunk)
+            table = to_output_table(process_leads_data(chunk))
+            csv_writer.write_table(table)
+            parquet_writer.write_table(table)
+    return preview, total_rows, csv_buffer.getvalue(), parquet_buffer.getvalue()
+
+@st.cache_data(max_entries=4, show_spinner="Processing leads...")
+def process_uploaded_csv(data):
+    # Cache once per uploaded file (keyed on its full bytes), not per chunk
+    return process_leads_in_chunks(io.BytesIO(data))
+
+def show_preview(df, total_rows=None):
+    # Only send the first rows to the browser; large sheets are summarized instead
+    if total_rows is None:
+        total_rows = len(df)
+    st.dataframe(df.head(PREVIEW_ROWS))
+    st.caption(f"{total_rows:,} rows × {df.shape[1]} columns")
+
+def show_downloads(csv_bytes, parquet_bytes):
+    st.download_button(
+        label="Download Processed SMS Contacts",
+        data=csv_bytes,
+        file_name="processed_leads.csv",
+        mime='text/csv'
+    )
+    st.download_button(
+        label="Download as Parquet",
+        data=parquet_bytes,
+        file_name="processed_leads.parquet",
+        mime='application/octet-stream'
+    )
 
 def main():
     st.title("Leads CSV to SMS Contacts Converter")
@@ -85,45 +254,26 @@ def main():
     uploaded_file = st.file_uploader("Or upload your leads CSV file", type=["csv"])
     
     if url_input:
-        raw_data = fetch_csv_from_url(url_input)
-        
-        if raw_data is not None:
+        try:
+            raw_data = fetch_csv_from_url(url_input)
+        except ValueError as e:
+            st.error(str(e))
+        except requests.RequestException:
+            st.error("Failed to fetch data from the URL.")
+        else:
             st.subheader("Raw Leads Data from URL")
-            st.write(raw_data)
+            show_preview(raw_data)
             
-            processed_data = process_leads_data(raw_data)
-            csv_buffer = io.StringIO()
-            processed_data.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            csv_bytes = csv_buffer.getvalue().encode('utf-8')
-
-            st.download_button(
-                label="Download Processed SMS Contacts",
-                data=csv_bytes,
-                file_name="processed_leads.csv",
-                mime='text/csv'
-            )
+            show_downloads(*process_sheet_data(raw_data))
         
     elif uploaded_file is not None:
         try:
-            raw_data = pd.read_csv(uploaded_file)
+            preview, total_rows, csv_bytes, parquet_bytes = process_uploaded_csv(uploaded_file.getvalue())
 
             st.subheader("Raw Leads Data")
-            st.write(raw_data)
-
-            processed_data = process_leads_data(raw_data)
-
-            csv_buffer = io.StringIO()
-            processed_data.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            csv_bytes = csv_buffer.getvalue().encode('utf-8')
+            show_preview(preview, total_rows)
 
-            st.download_button(
-                label="Download Processed SMS Contacts",
-                data=csv_bytes,
-                file_name="processed_leads.csv",
-                mime='text/csv'
-            )
+            show_downloads(csv_bytes, parquet_bytes)
         
         except Exception as e:
             st.error(f"An error occurred while processing the file: {e}")